@@ -2,21 +2,110 @@
 from __future__ import annotations
 from datetime import date, datetime, time
 from decimal import Decimal
-import csv, io, os, re, unicodedata, json
+import csv, io, os, re, sys, unicodedata, json, threading, queue, zipfile
+from select import select as wait_readable
+from time import monotonic, time as unix_time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import nullcontext
+from xml.sax.saxutils import escape as xml_escape
 
 from io import BytesIO
-from openpyxl import Workbook
+import click
+from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 from openpyxl.styles import Font, Alignment
 
 from flask import (
-    Flask, render_template, request, jsonify, session, redirect, url_for, make_response, flash
+    Flask, render_template, request, jsonify, session, redirect, url_for, make_response, flash,
+    Response, stream_with_context, g
 )
 from flask_sqlalchemy import SQLAlchemy
     # pip install psycopg2-binary si no tienes el driver
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, or_, select, text, false, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, declared_attr
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from db import get_conn
+
+
+# ---------------------------------------------------------------------
+# Exportación: trabajo por hoja (a nivel de módulo para poder enviarse a un ProcessPool)
+# ---------------------------------------------------------------------
+def export_cell(v):
+    """Valor de celda tal como se escribe en el Excel (booleans a Sí/No)."""
+    if v is True: return "Sí"
+    if v is False: return "No"
+    if isinstance(v, (date, datetime)): return v.isoformat()
+    if isinstance(v, time): return v.strftime("%H:%M:%S")
+    if isinstance(v, Decimal): return float(v)
+    return v
+
+def column_widths(rows, ncols):
+    """Largo máximo del texto por columna (para el ajuste de ancho)."""
+    widths = [0] * ncols
+    for r in rows:
+        for i, v in enumerate(r):
+            if v is not None:
+                widths[i] = max(widths[i], len(str(v)))
+    return widths
+
+def sheet_rows_xml(rows, first_row):
+    """
+    Filas de datos como elementos <row> del sheetData de SpreadsheetML (texto como
+    inlineStr, sin estilos), numeradas desde `first_row`.
+    """
+    letters = [get_column_letter(i + 1) for i in range(max((len(r) for r in rows), default=0))]
+    out = []
+    for n, r in enumerate(rows, start=first_row):
+        out.append(f'<row r="{n}">')
+        for i, v in enumerate(r):
+            if v is None:
+                continue
+            ref = f"{letters[i]}{n}"
+            if isinstance(v, (int, float)):
+                out.append(f'<c r="{ref}"><v>{v!r}</v></c>')
+            else:
+                v = xml_escape(ILLEGAL_CHARACTERS_RE.sub("", str(v)))
+                out.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{v}</t></is></c>')
+        out.append("</row>")
+    return "".join(out).encode("utf-8")
+
+def export_sheet_part(url, sql, params, ncols, first_row):
+    """
+    Ejecuta en un proceso aparte la consulta ya compilada de una hoja y devuelve
+    (XML de sus filas de datos, cantidad de filas, anchos por columna).
+    """
+    conn = get_conn(url)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = [[export_cell(v) for v in r] for r in cur]
+    finally:
+        conn.close()
+    return sheet_rows_xml(rows, first_row), len(rows), column_widths(rows, ncols)
+
+def splice_sheet_rows(xlsx, parts):
+    """
+    Inserta en cada hoja del libro `xlsx` (bytes) el XML de filas de `parts`
+    (uno por hoja, en orden) y devuelve el libro resultante. Se quita <dimension>
+    (opcional) porque ya no describe el rango real.
+    """
+    src = zipfile.ZipFile(BytesIO(xlsx))
+    out = BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as dst:
+        for item in src.infolist():
+            data = src.read(item)
+            m = re.fullmatch(r"xl/worksheets/sheet(\d+)\.xml", item.filename)
+            if m and int(m.group(1)) <= len(parts):
+                data = re.sub(rb"<dimension [^>]*/>", b"", data, count=1)
+                data = data.replace(b"</sheetData>", parts[int(m.group(1)) - 1] + b"</sheetData>", 1)
+            dst.writestr(item.filename, data)
+    return out.getvalue()
+
 
 # ---------------------------------------------------------------------
 # Configuración de la app y DB
@@ -42,6 +131,57 @@ def make_app():
     app.config["SQLALCHEMY_DATABASE_URI"] = DB_URI
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # Réplica de lectura opcional para reportes, exportaciones y listados
+    REPLICA_URI = os.getenv("REPLICA_DATABASE_URL")
+    if REPLICA_URI:
+        REPLICA_URI = REPLICA_URI.replace("postgres://", "postgresql://", 1)
+        app.config["SQLALCHEMY_BINDS"] = {"replica": {
+            "url": REPLICA_URI,
+            "pool_pre_ping": True,
+            "connect_args": {"connect_timeout": 2} if REPLICA_URI.startswith("postgresql") else {},
+        }}
+    app.config["REPLICA_MAX_LAG_SECONDS"] = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    app.config["REPLICA_CHECK_SECONDS"] = float(os.getenv("REPLICA_CHECK_SECONDS", "5"))
+
+    # Escritura agrupada (group commit) de inserciones concurrentes; 0 = desactivada.
+    # Un grupo no pasa del cupo de admisión de escrituras (3 por proceso): medido con
+    # bench_write_coalesce.py contra PostgreSQL, sin beneficio medible (x0.98 a x1.20).
+    app.config["WRITE_COALESCE_MS"] = int(os.getenv("WRITE_COALESCE_MS", "0"))
+    app.config["WRITE_COALESCE_MAX_ROWS"] = int(os.getenv("WRITE_COALESCE_MAX_ROWS", "50"))
+
+    # Procesos para armar exportaciones de varias tablas en paralelo
+    app.config["EXPORT_WORKERS"] = int(os.getenv("EXPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+    # Feed de cambios (SSE) alimentado por LISTEN/NOTIFY de PostgreSQL
+    app.config["CHANGE_FEED_CHANNEL"] = os.getenv("CHANGE_FEED_CHANNEL", "registerapp_cambios")
+    app.config["CHANGE_FEED_MAX_SECONDS"] = int(os.getenv("CHANGE_FEED_MAX_SECONDS", "300"))
+    # /api/stream solo se sirve en el proceso dedicado con workers gevent (stream_app.py);
+    # el proceso web (gthread) no presta hilos a conexiones de larga duración.
+    app.config["CHANGE_FEED_SERVER"] = os.getenv("CHANGE_FEED_SERVER", "0") == "1"
+    app.config["CHANGE_FEED_URL"] = os.getenv("CHANGE_FEED_URL", "").rstrip("/")          # URL pública del proceso stream
+    app.config["CHANGE_FEED_ALLOW_ORIGIN"] = os.getenv("CHANGE_FEED_ALLOW_ORIGIN", "")     # origen de la UI (CORS)
+    if os.getenv("SESSION_COOKIE_DOMAIN"):
+        # p.ej. ".example.com" para que feed.example.com reciba la sesión de app.example.com
+        app.config["SESSION_COOKIE_DOMAIN"] = os.getenv("SESSION_COOKIE_DOMAIN")
+
+    # Importación masiva: filas por lote de COPY
+    app.config["IMPORT_BATCH_ROWS"] = int(os.getenv("IMPORT_BATCH_ROWS", "5000"))
+
+    # Control de admisión (por proceso): requests simultáneos por clase de endpoint; 0 = sin límite.
+    # Un request en cola espera en su hilo, así que solo las clases baratas tienen cola:
+    # con --threads 4, export+report+stream (en curso + en cola) no pasan de 3 hilos.
+    app.config["ADMISSION_LIMITS"] = {
+        k: int(os.getenv(f"ADMISSION_{k.upper()}", str(v)))
+        for k, v in {"export": 1, "report": 1, "stream": 1, "write": 3, "login": 2}.items()
+    }
+    app.config["ADMISSION_QUEUES"] = {
+        k: int(os.getenv(f"ADMISSION_QUEUE_{k.upper()}", str(v)))
+        for k, v in {"export": 0, "report": 0, "stream": 0, "write": 2, "login": 2}.items()
+    }
+    app.config["ADMISSION_MAX_WAIT_MS"] = int(os.getenv("ADMISSION_MAX_WAIT_MS", "3000"))
+    app.config["ADMISSION_RETRY_AFTER"] = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+    app.config["QUERY_MAX_LIMIT"] = int(os.getenv("QUERY_MAX_LIMIT", "5000"))
+
     db = SQLAlchemy(app)
 
     # -----------------------------------------------------------------
@@ -78,7 +218,27 @@ def make_app():
         def check_password(self, raw): return check_password_hash(self.password_hash, raw)
 
     # -------- Operativas
-    class TempEquipos(db.Model):
+    class Tenant:
+        """
+        Razón social / restaurante dueños del registro (se llenan desde la sesión al
+        escribir). Los índices (tenant, fecha, id) respaldan las lecturas acotadas.
+        """
+        @declared_attr
+        def id_razon_social(cls):
+            return db.Column(db.Integer, db.ForeignKey("tbl_razon_social.id"))
+
+        @declared_attr
+        def id_restaurante(cls):
+            return db.Column(db.Integer, db.ForeignKey("tbl_restaurante.id"))
+
+        @declared_attr
+        def __table_args__(cls):
+            return (
+                db.Index(f"ix_{cls.__tablename__}_rs_fecha_id", "id_razon_social", "fecha", "id"),
+                db.Index(f"ix_{cls.__tablename__}_rest_fecha_id", "id_restaurante", "fecha", "id"),
+            )
+
+    class TempEquipos(Tenant, db.Model):
         __tablename__ = "tbl_temp_equipos"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -90,7 +250,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class TempAlimentos(db.Model):
+    class TempAlimentos(Tenant, db.Model):
         __tablename__ = "tbl_temp_alimentos"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -101,7 +261,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class AceiteQuemado(db.Model):
+    class AceiteQuemado(Tenant, db.Model):
         __tablename__ = "tbl_aceite_quemado"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -112,7 +272,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class LimpiezaTrampasTanque(db.Model):
+    class LimpiezaTrampasTanque(Tenant, db.Model):
         __tablename__ = "tbl_limpieza_trampas_tanque"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -123,7 +283,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class BPM(db.Model):
+    class BPM(Tenant, db.Model):
         __tablename__ = "tbl_bpm"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -140,7 +300,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class RecepcionMP(db.Model):
+    class RecepcionMP(Tenant, db.Model):
         __tablename__ = "tbl_recepcion_materias_primas"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -159,7 +319,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class LimpiezaZonasCom(db.Model):
+    class LimpiezaZonasCom(Tenant, db.Model):
         __tablename__ = "tbl_limpieza_zonascom"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -171,7 +331,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class LimpiezaGeneral(db.Model):
+    class LimpiezaGeneral(Tenant, db.Model):
         __tablename__ = "tbl_limpieza_general"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -182,7 +342,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class LimpiezaAlimentos(db.Model):
+    class LimpiezaAlimentos(Tenant, db.Model):
         __tablename__ = "tbl_limpieza_alimentos"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -193,7 +353,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class AguaPotable(db.Model):
+    class AguaPotable(Tenant, db.Model):
         __tablename__ = "tbl_agua_potable"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -206,7 +366,7 @@ def make_app():
         observaciones = db.Column(db.Text)
         usuario = db.Column(db.String(50))
 
-    class ResiduosSolidos(db.Model):
+    class ResiduosSolidos(Tenant, db.Model):
         __tablename__ = "tbl_residuos_solidos"
         id = db.Column(db.Integer, primary_key=True)
         fecha = db.Column(db.Date, nullable=False, default=today_default)
@@ -234,6 +394,44 @@ def make_app():
         rol = db.Column(db.String(64), unique=True, nullable=False)
         tabs_json = db.Column(db.Text, nullable=False)  # lista JSON de keys de pestañas
 
+    # --- Alertas: reglas configurables + último estado por equipo
+    class ConfReglaAlerta(db.Model):
+        __tablename__ = "conf_regla_alerta"
+        id = db.Column(db.Integer, primary_key=True)
+        tabla = db.Column(db.String(64), nullable=False)          # tabla operativa
+        tipo = db.Column(db.String(20), nullable=False)           # 'rango' | 'falso' | 'sin_cambio'
+        campo = db.Column(db.String(64), nullable=False)
+        minimo = db.Column(db.Numeric(8,2))                       # rango
+        maximo = db.Column(db.Numeric(8,2))                       # rango
+        dias = db.Column(db.Integer)                              # sin_cambio: días máximos sin campo=Sí
+        filtro_campo = db.Column(db.String(64))                   # opcional: solo filas con filtro_campo == filtro_valor
+        filtro_valor = db.Column(db.String(255))
+        descripcion = db.Column(db.String(255), nullable=False)
+        activo = db.Column(db.Boolean, nullable=False, default=True)
+
+    class EstadoAlerta(db.Model):
+        """Último estado por (regla, tenant, equipo): las alertas se leen de aquí, no del histórico."""
+        __tablename__ = "tbl_estado_alerta"
+        id = db.Column(db.Integer, primary_key=True)
+        id_regla = db.Column(db.Integer, db.ForeignKey("conf_regla_alerta.id", ondelete="CASCADE"), nullable=False)
+        id_razon_social = db.Column(db.Integer, db.ForeignKey("tbl_razon_social.id"))
+        id_restaurante = db.Column(db.Integer, db.ForeignKey("tbl_restaurante.id"))
+        clave = db.Column(db.String(255), nullable=False)         # equipo / freidora / proveedor…
+        valor = db.Column(db.String(100))                         # último valor leído
+        ultima_fecha = db.Column(db.Date)
+        ultimo_id = db.Column(db.Integer)                         # registro operativo que fijó el estado
+        alerta = db.Column(db.Boolean, nullable=False, default=False)
+        desde = db.Column(db.Date)                                # inicio de la alerta / último cambio (sin_cambio)
+        __table_args__ = (
+            db.Index("ix_estado_alerta_rs", "id_razon_social", "id_restaurante"),
+        )
+
+    # Único por (regla, tenant, clave); COALESCE porque en PostgreSQL los NULL no chocan
+    # en un UNIQUE y los usuarios sin restaurante tienen id_restaurante NULL.
+    db.Index("uq_estado_alerta", EstadoAlerta.id_regla,
+             func.coalesce(EstadoAlerta.id_razon_social, 0), func.coalesce(EstadoAlerta.id_restaurante, 0),
+             EstadoAlerta.clave, unique=True)
+
     # Mapas
     MODEL_MAP = {
         "tbl_razon_social": RazonSocial,
@@ -253,6 +451,7 @@ def make_app():
         "tbl_agua_potable": AguaPotable,
         "tbl_residuos_solidos": ResiduosSolidos,
         "conf_parametro_operativo": ConfParametroOperativo,
+        "conf_regla_alerta": ConfReglaAlerta,
     }
     
     # --- Orden y etiquetas bonitas ---
@@ -326,6 +525,25 @@ def make_app():
     
     DEFAULT_ROLES = ["Admin","Supervisor","Operativo"]
 
+    # --- Alertas: columnas que identifican el "equipo" de cada tabla y reglas iniciales
+    ALERT_KEY_COLS = {
+        "tbl_temp_equipos": ["tipo_de_equipo","num_equipo"],
+        "tbl_aceite_quemado": ["num_freidora"],
+        "tbl_recepcion_materias_primas": ["proveedor","mp_insumo"],
+    }
+    DEFAULT_ALERT_RULES = [
+        {"tabla":"tbl_temp_equipos","tipo":"rango","campo":"temperatura","minimo":0,"maximo":5,
+         "filtro_campo":"tipo_de_equipo","filtro_valor":"refrigeracion","descripcion":"Refrigeración fuera de 0 a 5 °C"},
+        {"tabla":"tbl_temp_equipos","tipo":"rango","campo":"temperatura","maximo":-10,
+         "filtro_campo":"tipo_de_equipo","filtro_valor":"congelacion","descripcion":"Congelación por encima de -10 °C"},
+        {"tabla":"tbl_temp_equipos","tipo":"rango","campo":"temperatura","minimo":65,
+         "filtro_campo":"tipo_de_equipo","filtro_valor":"caliente","descripcion":"Equipo caliente por debajo de 65 °C"},
+        {"tabla":"tbl_agua_potable","tipo":"rango","campo":"cloro","minimo":0.3,"maximo":2,"descripcion":"Cloro fuera de 0,3 a 2 ppm"},
+        {"tabla":"tbl_agua_potable","tipo":"rango","campo":"ph","minimo":6.5,"maximo":9,"descripcion":"pH fuera de 6,5 a 9"},
+        {"tabla":"tbl_aceite_quemado","tipo":"sin_cambio","campo":"cambio_de_aceite","dias":7,"descripcion":"Freidora sin cambio de aceite"},
+        {"tabla":"tbl_recepcion_materias_primas","tipo":"falso","campo":"aceptado","descripcion":"Recepción no aceptada"},
+    ]
+
     # --- Helpers dinámicos de permisos por rol
     def all_tab_keys():
         catalogs = ["tbl_razon_social","tbl_restaurante","tbl_roles","tbl_usuario","conf_parametro_operativo"]
@@ -397,12 +615,24 @@ def make_app():
     # -----------------------------------------------------------------
     with app.app_context():
         try:
-            db.create_all()
+            db.create_all(bind_key=None)  # la réplica no se toca
         except Exception as e:
             print("\n[ERROR] No se pudo crear/esquema en PostgreSQL:", repr(e), "\n")
             raise
 
+        # create_all no altera tablas existentes. Las columnas de tenant de tablas
+        # anteriores las agrega `python app.py migrate-tenant` (una vez por deploy, fase
+        # release del Procfile), no cada proceso al arrancar.
+        insp = inspect(db.engine)
+        missing = [t for t in ORDER_BY_TABLE if "id_razon_social" not in {c["name"] for c in insp.get_columns(t)}]
+        if missing:
+            print("\n[ERROR] Faltan las columnas de tenant en:", ", ".join(missing),
+                  "\n        Ejecuta: python app.py migrate-tenant\n")
+
         # semillas mínimas
+        if not ConfReglaAlerta.query.first():
+            db.session.add_all([ConfReglaAlerta(**r) for r in DEFAULT_ALERT_RULES])
+            db.session.commit()
         if not Rol.query.first():
             db.session.add_all([Rol(nom_rol="Admin"), Rol(nom_rol="Supervisor"), Rol(nom_rol="Operativo")])
             db.session.commit()
@@ -469,6 +699,522 @@ def make_app():
         value = re.sub(r'[^a-zA-Z0-9]+', '-', value).strip('-').lower()
         return value or 'logo'
 
+    # -----------------------------------------------------------------
+    # Tenant: razón social / restaurante del usuario en sesión
+    # -----------------------------------------------------------------
+    def remember_tenant(u):
+        session["id_razon_social"] = u.id_razon_social
+        session["id_restaurante"] = u.id_restaurante
+
+    def tenant_scope():
+        """
+        (columna, valor) que acota las tablas operativas para el usuario en sesión:
+        su restaurante, o su razón social si no tiene restaurante o es Admin.
+        None si no hay usuario en sesión.
+        """
+        if "id_razon_social" not in session:
+            u = Usuario.query.filter_by(nom_usuario=session.get("usuario")).first() if session.get("usuario") else None
+            if not u:
+                return None
+            remember_tenant(u)
+        if session.get("id_restaurante") and session.get("rol") != "Admin":
+            return ("id_restaurante", session["id_restaurante"])
+        return ("id_razon_social", session["id_razon_social"])
+
+    def tenant_values():
+        """Columnas de tenant para una fila operativa nueva (siempre las de la sesión)."""
+        tenant_scope()
+        return {"id_razon_social": session.get("id_razon_social"), "id_restaurante": session.get("id_restaurante")}
+
+    def tenant_filters(M):
+        """Filtros de tenant (vacío para catálogos); sin sesión no devuelve filas."""
+        if M.__tablename__ not in ORDER_BY_TABLE:
+            return []
+        scope = tenant_scope()
+        if scope is None:
+            return [false()]
+        return [getattr(M, scope[0]) == scope[1]]
+
+    def recent_first(M):
+        """Orden 'más recientes primero'; en operativas sigue el índice (tenant, fecha, id)."""
+        if M.__tablename__ in ORDER_BY_TABLE:
+            return (M.fecha.desc(), M.id.desc())
+        return (M.id.desc(),)
+
+    # -----------------------------------------------------------------
+    # Ruteo de lecturas: réplica si está al día, si no el primario
+    # -----------------------------------------------------------------
+    replica_state = {"checked": None, "ok": False, "probing": False}
+    replica_lock = threading.Lock()
+
+    def replica_is_fresh():
+        """
+        True si la réplica responde y su retraso no supera REPLICA_MAX_LAG_SECONDS.
+        Se compara con la posición del WAL del primario: si la réplica dejó de recibir,
+        el primario avanza y el retraso (desde la última transacción aplicada) crece;
+        comparar solo contra lo recibido por la réplica daría 0 para siempre.
+        El resultado se cachea REPLICA_CHECK_SECONDS; un solo request hace la
+        consulta (fuera del lock) y los demás usan el último valor mientras tanto.
+        """
+        if not REPLICA_URI:
+            return False
+        with replica_lock:
+            checked = replica_state["checked"]
+            if replica_state["probing"] or (checked is not None and monotonic() - checked < app.config["REPLICA_CHECK_SECONDS"]):
+                return replica_state["ok"]
+            replica_state["probing"] = True
+        ok = False
+        try:
+            with db.engine.connect() as conn:
+                primary_lsn = conn.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+            with db.engines["replica"].connect() as conn:
+                # NULL (nunca aplicó una transacción y está atrasada) = no está al día
+                lag = conn.execute(text(
+                    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+                    "  OR pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn) THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                ), {"lsn": primary_lsn}).scalar()
+            ok = lag is not None and float(lag) <= app.config["REPLICA_MAX_LAG_SECONDS"]
+        except Exception as e:
+            print("[replica] no disponible, se usa el primario:", repr(e))
+        finally:
+            with replica_lock:
+                replica_state.update(ok=ok, checked=monotonic(), probing=False)
+        return ok
+
+    # Tras escribir, las lecturas de esa sesión siguen en el primario mientras la réplica
+    # pueda no tener la escritura (retraso máximo + antigüedad del último chequeo).
+    WRITE_ENDPOINTS = {"api_create", "api_update", "api_delete", "api_import"}
+
+    @app.after_request
+    def remember_write(resp):
+        if REPLICA_URI and request.endpoint in WRITE_ENDPOINTS and resp.status_code < 400:
+            session["ultima_escritura"] = unix_time()
+        return resp
+
+    def use_replica():
+        window = app.config["REPLICA_MAX_LAG_SECONDS"] + app.config["REPLICA_CHECK_SECONDS"]
+        if unix_time() - session.get("ultima_escritura", 0) < window:
+            return False
+        return replica_is_fresh()
+
+    def read_session():
+        """
+        Sesión para lecturas de reportes y listados. Las escrituras y la fila que
+        devuelven api_create/api_update siguen siempre en db.session (primario).
+        """
+        if not use_replica():
+            return db.session
+        if "read_session" not in g:
+            g.read_session = Session(db.engines["replica"])
+        return g.read_session
+
+    def read_url():
+        """URL para los procesos de exportación (mismo criterio que read_session)."""
+        return REPLICA_URI if use_replica() else DB_URI
+
+    @app.teardown_appcontext
+    def close_read_session(exc):
+        s = g.pop("read_session", None)
+        if s is not None:
+            s.close()
+
+    # -----------------------------------------------------------------
+    # Feed de cambios: NOTIFY en las escrituras, un LISTEN por proceso
+    # -----------------------------------------------------------------
+    FEED_ENABLED = DB_URI.startswith("postgresql")
+
+    def notify_change(table, op, row):
+        """
+        Publica el cambio de una fila operativa dentro de la transacción actual
+        (PostgreSQL solo lo entrega si hay commit). Si la fila no cabe en el
+        límite de NOTIFY se envía solo el id y el cliente recarga la lista.
+        """
+        if not FEED_ENABLED or table not in ORDER_BY_TABLE:
+            return
+        msg = {"table": table, "op": op, "id": row.get("id"), "row": row,
+               "id_razon_social": row.get("id_razon_social"), "id_restaurante": row.get("id_restaurante")}
+        payload = json.dumps(msg, default=str)
+        if len(payload.encode("utf-8")) > 7900:
+            msg["row"] = None
+            payload = json.dumps(msg, default=str)
+        db.session.execute(text("SELECT pg_notify(:ch, :payload)"),
+                           {"ch": app.config["CHANGE_FEED_CHANNEL"], "payload": payload})
+
+    class ChangeFeed:
+        """
+        Un hilo por proceso escucha el canal con una conexión psycopg2 dedicada
+        y reparte cada notificación a las colas de los clientes SSE suscritos.
+        """
+        def __init__(self, url, channel):
+            self.url, self.channel = url, channel
+            self.lock = threading.Lock()
+            self.subscribers = set()
+            self.thread = None
+
+        def subscribe(self, tables, scope):
+            """`scope` es el (columna, valor) de tenant_scope(): solo llegan cambios de ese tenant."""
+            q = queue.Queue(maxsize=1000)
+            with self.lock:
+                self.subscribers.add((q, frozenset(tables), scope))
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self.listen, name="change-feed", daemon=True)
+                    self.thread.start()
+            return q
+
+        def unsubscribe(self, q):
+            with self.lock:
+                self.subscribers = {s for s in self.subscribers if s[0] is not q}
+
+        def publish(self, raw):
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                return
+            with self.lock:
+                subs = list(self.subscribers)
+            for q, tables, (col, value) in subs:
+                if msg.get("table") in tables and msg.get(col) == value:
+                    try:
+                        q.put_nowait(msg)
+                    except queue.Full:
+                        pass  # cliente lento: se perderá el cambio, recargará al reconectar
+
+        def listen(self):
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        self.thread = None
+                        return
+                conn = None
+                try:
+                    conn = get_conn(self.url)
+                    conn.autocommit = True
+                    with conn.cursor() as cur:
+                        cur.execute(f'LISTEN "{self.channel}"')
+                    while self.subscribers:
+                        if wait_readable([conn], [], [], 5)[0]:
+                            conn.poll()
+                            while conn.notifies:
+                                self.publish(conn.notifies.pop(0).payload)
+                except Exception as e:
+                    print("[change-feed] conexión perdida:", repr(e))
+                    threading.Event().wait(2)
+                finally:
+                    if conn is not None:
+                        conn.close()
+
+    change_feed = ChangeFeed(DB_URI, app.config["CHANGE_FEED_CHANNEL"]) if FEED_ENABLED else None
+
+    # -----------------------------------------------------------------
+    # Escritura agrupada (group commit)
+    # -----------------------------------------------------------------
+    class GroupCommit:
+        """
+        Agrupa inserciones concurrentes de una misma tabla en una sola transacción.
+        El primer request que llega abre un grupo y hace de líder: si no hay otro
+        commit de la tabla en curso inserta enseguida; si lo hay, el grupo sigue
+        recibiendo filas mientras ese commit termina (como mucho WRITE_COALESCE_MS
+        o hasta WRITE_COALESCE_MAX_ROWS filas). Luego inserta todas las filas, cada
+        una en su SAVEPOINT para aislar errores, y hace un único commit.
+        Los demás requests esperan su resultado (dict de la fila o excepción).
+        """
+        def __init__(self, window_ms: int, max_rows: int):
+            self.window = window_ms / 1000.0
+            self.max_rows = max(1, max_rows)
+            self.lock = threading.Lock()
+            self.pending = {}   # tabla -> grupo abierto
+            self.flushing = {}  # tabla -> Lock tomado mientras un líder hace commit
+
+        def submit(self, table, build):
+            slot = {"build": build, "done": threading.Event(), "result": None, "error": None}
+            with self.lock:
+                group = self.pending.get(table)
+                leader = group is None
+                if leader:
+                    group = self.pending[table] = {"slots": []}
+                group["slots"].append(slot)
+                if len(group["slots"]) >= self.max_rows:
+                    # grupo lleno: los siguientes abren uno nuevo
+                    self.pending.pop(table, None)
+                flushing = self.flushing.setdefault(table, threading.Lock())
+
+            if leader:
+                # sin commit en curso no se espera nada; con uno en curso el grupo se
+                # llena mientras termina (si tarda más que la ventana se hace en paralelo)
+                got = flushing.acquire(timeout=self.window)
+                with self.lock:
+                    if self.pending.get(table) is group:
+                        del self.pending[table]
+                try:
+                    self.flush(table, group["slots"])
+                finally:
+                    if got:
+                        flushing.release()
+            else:
+                slot["done"].wait()
+
+            if slot["error"] is not None:
+                raise slot["error"]
+            return slot["result"]
+
+        def flush(self, table, slots):
+            ok = []
+            # con una sola fila no hay nada que aislar: se ahorra el SAVEPOINT
+            isolate = db.session.begin_nested if len(slots) > 1 else nullcontext
+            try:
+                for s in slots:
+                    try:
+                        with isolate():
+                            obj = s["build"]()
+                            db.session.add(obj)
+                            db.session.flush()
+                            s["result"] = to_dict(obj)
+                            notify_change(table, "insert", s["result"])
+                            evaluate_alerts(table, s["result"])
+                        ok.append(s)
+                    except Exception as e:
+                        s["error"] = e
+                if ok:
+                    db.session.commit()
+                else:
+                    db.session.rollback()
+            except Exception as e:
+                db.session.rollback()
+                for s in ok:
+                    s["result"], s["error"] = None, e
+            finally:
+                for s in slots:
+                    s["done"].set()
+
+    group_commit = None
+    if app.config["WRITE_COALESCE_MS"] > 0:
+        group_commit = GroupCommit(app.config["WRITE_COALESCE_MS"], app.config["WRITE_COALESCE_MAX_ROWS"])
+
+    # -----------------------------------------------------------------
+    # Alertas incrementales: cada escritura actualiza el último estado
+    # -----------------------------------------------------------------
+    alert_cache = {"at": None, "rules": {}}
+    alert_cache_lock = threading.Lock()
+
+    def alert_rules(table):
+        """
+        Reglas activas de la tabla, cacheadas 30 s. Editar conf_regla_alerta vacía
+        el caché solo en el proceso que atendió la edición; los demás workers
+        pueden usar las reglas anteriores hasta 30 s más.
+        """
+        with alert_cache_lock:
+            if alert_cache["at"] is None or monotonic() - alert_cache["at"] > 30:
+                by_table = {}
+                for r in ConfReglaAlerta.query.filter_by(activo=True).all():
+                    by_table.setdefault(r.tabla, []).append({
+                        "id": r.id, "tipo": r.tipo, "campo": r.campo, "dias": r.dias,
+                        "minimo": None if r.minimo is None else float(r.minimo),
+                        "maximo": None if r.maximo is None else float(r.maximo),
+                        "filtro_campo": r.filtro_campo, "filtro_valor": r.filtro_valor,
+                    })
+                alert_cache["rules"], alert_cache["at"] = by_table, monotonic()
+            return alert_cache["rules"].get(table, [])
+
+    def alert_key(table, row):
+        cols = ALERT_KEY_COLS.get(table, [])
+        return ", ".join(f"{NICE_LABEL.get(c, c)}: {row.get(c)}" for c in cols) or FORMAL_NAMES.get(table, table)
+
+    def as_number(v):
+        try:
+            return float(str(v).replace(",", "."))
+        except (TypeError, ValueError):
+            return None
+
+    def rule_alarms(rule, value):
+        """Si `value` dispara una regla 'rango' o 'falso'."""
+        if rule["tipo"] == "rango":
+            n = as_number(value)
+            return n is not None and (
+                (rule["minimo"] is not None and n < rule["minimo"]) or
+                (rule["maximo"] is not None and n > rule["maximo"]))
+        return value is False
+
+    def rule_matches(rule, row):
+        fc = rule["filtro_campo"]
+        return not fc or str(row.get(fc) or "").strip().lower() == str(rule["filtro_valor"] or "").strip().lower()
+
+    def alert_ident(rule, table, row):
+        return {"id_regla": rule["id"], "id_razon_social": row.get("id_razon_social"),
+                "id_restaurante": row.get("id_restaurante"), "clave": alert_key(table, row)[:255]}
+
+    def apply_alert_rule(st, rule, row, fecha):
+        """Actualiza el estado `st` con la fila `row` (dict de to_dict) según `rule`."""
+        value = row.get(rule["campo"])
+        newer = st.ultima_fecha is None or (fecha, row["id"]) >= (st.ultima_fecha, st.ultimo_id or 0)
+
+        if rule["tipo"] == "sin_cambio":
+            # 'desde' = último día con campo=Sí; la alerta se calcula al leer (días transcurridos)
+            if value is True and (st.desde is None or fecha > st.desde):
+                st.desde = fecha
+            elif st.desde is None:
+                st.desde = fecha
+        elif newer:
+            alerta = rule_alarms(rule, value)
+            if alerta and not st.alerta:
+                st.desde = fecha
+            elif not alerta:
+                st.desde = None
+            st.alerta = alerta
+
+        if newer:
+            st.ultima_fecha, st.ultimo_id = fecha, row["id"]
+            st.valor = None if value is None else export_cell(value)
+
+    def evaluate_alerts(table, row):
+        """
+        Evalúa las reglas de `table` contra la fila recién escrita y actualiza
+        tbl_estado_alerta dentro de la misma transacción. No recorre el histórico.
+        """
+        if table not in ORDER_BY_TABLE:
+            return
+        fecha = date.fromisoformat(row["fecha"]) if row.get("fecha") else date.today()
+        for rule in alert_rules(table):
+            if not rule_matches(rule, row):
+                continue
+            ident = alert_ident(rule, table, row)
+            st = EstadoAlerta.query.filter_by(**ident).with_for_update().first()
+            if st is None:
+                try:
+                    with db.session.begin_nested():
+                        st = EstadoAlerta(**ident, alerta=False)
+                        apply_alert_rule(st, rule, row, fecha)
+                        db.session.add(st)
+                    continue
+                except IntegrityError:
+                    # otro request creó el mismo estado en paralelo
+                    st = EstadoAlerta.query.filter_by(**ident).with_for_update().first()
+            apply_alert_rule(st, rule, row, fecha)
+
+    def rebuild_alerts(table, row):
+        """
+        Tras borrar `row` (dict de to_dict) rehace los estados de su clave desde el
+        registro más reciente que queda (índice tenant, fecha, id); en 'sin_cambio'
+        'desde' sale del último registro con campo=Sí. Sin registros, el estado se borra.
+        """
+        if table not in ORDER_BY_TABLE:
+            return
+        M = MODEL_MAP[table]
+        for rule in alert_rules(table):
+            if not rule_matches(rule, row):
+                continue
+            st = EstadoAlerta.query.filter_by(**alert_ident(rule, table, row)).with_for_update().first()
+            if st is None:
+                continue
+            q = M.query.filter(M.id != row["id"], M.id_razon_social == row.get("id_razon_social"),
+                               M.id_restaurante == row.get("id_restaurante"),
+                               *[getattr(M, c) == row.get(c) for c in ALERT_KEY_COLS.get(table, [])])
+            if rule["filtro_campo"]:
+                fcol = func.lower(func.trim(db.cast(getattr(M, rule["filtro_campo"]), db.String)))
+                q = q.filter(fcol == str(rule["filtro_valor"] or "").strip().lower())
+            newest = q.order_by(M.fecha.desc(), M.id.desc()).first()
+            if newest is None:
+                db.session.delete(st)
+                continue
+            value = getattr(newest, rule["campo"])
+            if rule["tipo"] == "sin_cambio":
+                changed = (q.filter(getattr(M, rule["campo"]) == True).order_by(M.fecha.desc(), M.id.desc()).first()
+                           or q.order_by(M.fecha.asc(), M.id.asc()).first())
+                st.desde = changed.fecha
+            else:
+                alerta = rule_alarms(rule, value)
+                # la racha sigue si ya incluía al registro que queda; si no, empieza en él
+                if alerta:
+                    st.desde = st.desde if st.alerta and st.desde and st.desde <= newest.fecha else newest.fecha
+                else:
+                    st.desde = None
+                st.alerta = alerta
+            st.ultima_fecha, st.ultimo_id = newest.fecha, newest.id
+            st.valor = None if value is None else export_cell(value)
+
+    # -----------------------------------------------------------------
+    # Control de admisión por clase de endpoint
+    # -----------------------------------------------------------------
+    class Admission:
+        """
+        Presupuesto de concurrencia de una clase de endpoints con cola acotada:
+        si no hay cupo se espera hasta ADMISSION_MAX_WAIT_MS (ocupando el hilo
+        mientras espera); con la cola llena o la espera vencida se responde 503.
+        """
+        def __init__(self, limit, max_queue, max_wait_ms):
+            self.limit, self.max_queue, self.max_wait = limit, max_queue, max_wait_ms / 1000.0
+            self.cond = threading.Condition()
+            self.in_flight = self.waiting = 0
+            self.admitted = self.rejected = self.timed_out = 0
+            self.max_wait_seen = 0.0
+
+        def acquire(self):
+            with self.cond:
+                if self.in_flight < self.limit and not self.waiting:
+                    self.in_flight += 1; self.admitted += 1
+                    return True
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                start = monotonic()
+                try:
+                    while self.in_flight >= self.limit:
+                        remaining = start + self.max_wait - monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            return False
+                        self.cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                self.max_wait_seen = max(self.max_wait_seen, monotonic() - start)
+                self.in_flight += 1; self.admitted += 1
+                return True
+
+        def release(self):
+            with self.cond:
+                self.in_flight -= 1
+                self.cond.notify()
+
+        def state(self):
+            with self.cond:
+                return {"limite": self.limit, "cola_max": self.max_queue, "en_curso": self.in_flight,
+                        "en_cola": self.waiting, "admitidas": self.admitted, "rechazadas": self.rejected,
+                        "vencidas": self.timed_out, "max_espera_ms": round(self.max_wait_seen * 1000, 1)}
+
+    ADMISSION_CLASS = {
+        "api_export": "export", "api_import": "export",
+        "api_query": "report",
+        "api_stream": "stream",
+        "api_create": "write", "api_update": "write", "api_delete": "write",
+        "login": "login",
+    }
+    admission = {
+        k: Admission(v, app.config["ADMISSION_QUEUES"].get(k, 0), app.config["ADMISSION_MAX_WAIT_MS"])
+        for k, v in app.config["ADMISSION_LIMITS"].items() if v > 0
+    }
+
+    @app.before_request
+    def admission_acquire():
+        cls = ADMISSION_CLASS.get(request.endpoint)
+        if cls == "login" and request.method != "POST":
+            return None
+        gate = admission.get(cls)
+        if gate is None:
+            return None
+        if not gate.acquire():
+            resp = make_response("Servidor ocupado, reintenta en unos segundos", 503)
+            resp.headers["Retry-After"] = str(app.config["ADMISSION_RETRY_AFTER"])
+            return resp
+        g.admission = gate
+
+    @app.teardown_request
+    def admission_release(exc):
+        # con stream_with_context el teardown llega al terminar el stream SSE
+        gate = g.pop("admission", None)
+        if gate is not None:
+            gate.release()
+
     # -----------------------------------------------------------------
     # Auth mínima (ya tienes login.html propio)
     # -----------------------------------------------------------------
@@ -481,6 +1227,7 @@ def make_app():
             if u and u.check_password(pwd):
                 session["usuario"] = u.nom_usuario
                 session["rol"] = Rol.query.get(u.id_rol).nom_rol
+                remember_tenant(u)
                 return redirect(url_for("register"))
             flash("Credenciales inválidas")
         return render_template("login.html")
@@ -502,6 +1249,7 @@ def make_app():
             user = Usuario.query.filter_by(nom_usuario="admin").first()
             session["usuario"] = user.nom_usuario
             session["rol"] = Rol.query.get(user.id_rol).nom_rol
+            remember_tenant(user)
 
         rol = session.get("rol", "Admin")
 
@@ -549,7 +1297,9 @@ def make_app():
             all_roles=all_roles,
             roles_tabs=roles_tabs,
             nice_labels=NICE_LABEL,
-            order_by_table=ORDER_BY_TABLE
+            order_by_table=ORDER_BY_TABLE,
+            feed_url=(app.config["CHANGE_FEED_URL"] + "/api/stream") if FEED_ENABLED and
+                     (app.config["CHANGE_FEED_URL"] or app.config["CHANGE_FEED_SERVER"]) else None
         )
 
     # -----------------------------------------------------------------
@@ -560,6 +1310,9 @@ def make_app():
         M = MODEL_MAP.get(table)
         if not M:
             return "Tabla desconocida", 404
+        # una fila operativa sin tenant no aparecería en ninguna lectura
+        if table in ORDER_BY_TABLE and tenant_scope() is None:
+            return "Sesión requerida", 401
 
         payload = request.get_json(force=True, silent=True) or {}
 
@@ -575,6 +1328,14 @@ def make_app():
         if "usuario" in M.__table__.columns and not data.get("usuario"):
             data["usuario"] = session.get("usuario")
 
+        # tablas operativas: el tenant siempre sale de la sesión, nunca del payload
+        if table in ORDER_BY_TABLE:
+            data.update(tenant_values())
+
+        # tablas operativas: inserción agrupada con otras concurrentes (si está activa)
+        if group_commit and table in ORDER_BY_TABLE:
+            return jsonify(group_commit.submit(table, lambda: M(**data))), 201
+
         obj = M(**data)
 
         if table == "tbl_usuario":
@@ -583,8 +1344,13 @@ def make_app():
             obj.set_password(pwd)
 
         db.session.add(obj)
+        db.session.flush()
+        row = to_dict(obj)
+        notify_change(table, "insert", row)
+        evaluate_alerts(table, row)
+        if table == "conf_regla_alerta": alert_cache["at"] = None
         db.session.commit()
-        return jsonify(to_dict(obj)), 201
+        return jsonify(row), 201
 
     @app.route("/api/<table>/<int:pk>", methods=["PUT"])
     def api_update(table, pk):
@@ -592,7 +1358,7 @@ def make_app():
         if not M:
             return "Tabla desconocida", 404
 
-        obj = M.query.get_or_404(pk)
+        obj = M.query.filter(M.id == pk, *tenant_filters(M)).first_or_404()
         payload = request.get_json(force=True, silent=True) or {}
 
         # ---- si viene nueva contraseña, hashearla
@@ -601,28 +1367,89 @@ def make_app():
             new_pwd = payload.pop("contraseña", None) or payload.pop("contrasena", None)
 
         data = parse_incoming(M, payload)
+        if table in ORDER_BY_TABLE:
+            data.pop("id_razon_social", None); data.pop("id_restaurante", None)
         for k, v in data.items():
             setattr(obj, k, v)
 
         if table == "tbl_usuario" and new_pwd:
             obj.set_password(new_pwd)
 
+        db.session.flush()
+        row = to_dict(obj)
+        notify_change(table, "update", row)
+        evaluate_alerts(table, row)
+        if table == "conf_regla_alerta": alert_cache["at"] = None
         db.session.commit()
-        return jsonify(to_dict(obj))
+        return jsonify(row)
 
     @app.route("/api/<table>/<int:pk>", methods=["DELETE"])
     def api_delete(table, pk):
         M = MODEL_MAP.get(table)
         if not M: return "Tabla desconocida", 404
-        obj = M.query.get_or_404(pk)
-        db.session.delete(obj); db.session.commit()
+        obj = M.query.filter(M.id == pk, *tenant_filters(M)).first_or_404()
+        row = to_dict(obj)
+        db.session.delete(obj)
+        if table in ORDER_BY_TABLE:
+            notify_change(table, "delete", {"id": pk, "id_razon_social": obj.id_razon_social,
+                                            "id_restaurante": obj.id_restaurante})
+            rebuild_alerts(table, row)
+        if table == "conf_regla_alerta": alert_cache["at"] = None
+        db.session.commit()
         return "", 204
 
+    @app.route("/api/stream", methods=["GET"])
+    def api_stream():
+        """
+        Server-Sent Events con los cambios de las tablas operativas pedidas
+        (?tables=tbl_bpm,tbl_temp_equipos). Solo en el proceso stream (gevent),
+        donde cada conexión abierta es un greenlet en espera y no un hilo.
+        La conexión se cierra sola tras CHANGE_FEED_MAX_SECONDS y el navegador
+        reconecta (campo retry).
+        """
+        if not change_feed or not app.config["CHANGE_FEED_SERVER"]:
+            return "Feed de cambios no disponible", 404
+        wanted = [t for t in (request.args.get("tables") or "").split(",") if t in ORDER_BY_TABLE]
+        if not wanted:
+            return "Tabla desconocida", 404
+
+        scope = tenant_scope()
+        if scope is None:
+            return "Sesión requerida", 401
+        # tenant_scope puede haber consultado Usuario: se devuelve la conexión al pool,
+        # porque stream_with_context mantiene el contexto vivo todo el stream
+        db.session.remove()
+        q = change_feed.subscribe(wanted, scope)
+        max_seconds = app.config["CHANGE_FEED_MAX_SECONDS"]
+
+        def events():
+            try:
+                yield "retry: 3000\n\n"
+                deadline = monotonic() + max_seconds
+                while monotonic() < deadline:
+                    try:
+                        msg = q.get(timeout=15)
+                    except queue.Empty:
+                        yield ": ping\n\n"
+                        continue
+                    yield f"event: change\ndata: {json.dumps(msg, default=str)}\n\n"
+            finally:
+                change_feed.unsubscribe(q)
+
+        resp = Response(stream_with_context(events()), mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["X-Accel-Buffering"] = "no"
+        origin = app.config["CHANGE_FEED_ALLOW_ORIGIN"]
+        if origin and request.headers.get("Origin") == origin:
+            resp.headers["Access-Control-Allow-Origin"] = origin
+            resp.headers["Access-Control-Allow-Credentials"] = "true"
+        return resp
+
     # -----------------------------------------------------------------
     # Reportes / Exportar
     # -----------------------------------------------------------------
     def build_filters(M, payload):
-        f = []
+        f = tenant_filters(M)
         df, dt = payload.get("date_from"), payload.get("date_to")
         if hasattr(M, "fecha"):
             if df: f.append(M.fecha >= datetime.strptime(df,"%Y-%m-%d").date())
@@ -644,47 +1471,30 @@ def make_app():
         table = p.get("table")
         M = MODEL_MAP.get(table)
         if not M: return "Tabla desconocida", 404
-        q = M.query
+        q = read_session().query(M)
         flt = build_filters(M, p)
         if flt: q = q.filter(and_(*flt))
-        rows = q.order_by(M.id.desc()).limit(int(p.get("limit", 500))).all()
+        limit = min(int(p.get("limit", 500)), app.config["QUERY_MAX_LIMIT"])
+        rows = q.order_by(*recent_first(M)).limit(limit).all()
         return jsonify([to_dict(x) for x in rows])
 
-    @app.route("/api/export", methods=["POST"])
-    def api_export():
-        p = request.get_json(force=True) or {}
-        table = p.get("table")
-        M = MODEL_MAP.get(table)
-        if not M:
-            return "Tabla desconocida", 404
-
-        # ----- Consulta con filtros -----
-        q = M.query
-        flt = build_filters(M, p)
-        if flt:
-            q = q.filter(and_(*flt))
-        rows = q.order_by(M.id.desc()).all()
-
-        # ----- Columnas visibles + orden común (global) -----
+    def export_cols(M, table):
+        """Columnas visibles + orden común (global)."""
         hide = {"id","password_hash","usuario","id_razon_social","id_rol","id_restaurante"}
         base_cols = [c.name for c in M.__table__.columns if c.name not in hide]
         ordered = ORDER_BY_TABLE.get(table, base_cols)
-        cols = [c for c in ordered if c in base_cols] or base_cols
-
-        # ----- Excel -----
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Datos"
+        return [c for c in ordered if c in base_cols] or base_cols
 
-        # ===== Título con nombre formal de la tabla =====
-        title_text = FORMAL_NAMES.get(table, table)
-        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(cols))
-        tcell = ws.cell(row=1, column=1)
-        tcell.value = f"Exportación: {title_text}"
-        tcell.font = Font(size=14, bold=True)
-        tcell.alignment = Alignment(horizontal="center")
+    def export_statement(M, cols, p):
+        """SELECT de las columnas visibles con los filtros del payload."""
+        stmt = select(*[M.__table__.c[c] for c in cols])
+        flt = build_filters(M, p)
+        if flt:
+            stmt = stmt.where(and_(*flt))
+        return stmt.order_by(*recent_first(M))
 
-        # ===== Resumen de filtros aplicados (si los hay) =====
+    def export_filters_lines(table, p, cf):
+        """Resumen legible de los filtros aplicados (si los hay)."""
         def _pretty_bool(v: str):
             s = str(v).strip().lower()
             if s in ("true","1","t","si","sí","yes"): return "Sí"
@@ -698,7 +1508,6 @@ def make_app():
         elif df:        filters_lines.append(f"Fecha desde: {df}")
         elif dt:        filters_lines.append(f"Fecha hasta: {dt}")
 
-        cf = p.get("column_filters") or {}
         ordered_cf_keys = [c for c in ORDER_BY_TABLE.get(table, cf.keys()) if c in cf] or list(cf.keys())
         for k in ordered_cf_keys:
             raw = cf[k]
@@ -708,7 +1517,23 @@ def make_app():
                 filters_lines.append(f'{lbl}: contiene "{raw.strip()}"')
             else:
                 filters_lines.append(f"{lbl}: {pb if pb is not None else raw}")
+        return filters_lines
+
+    def write_export_sheet(ws, table, cols, filters_lines, rows, widths, nrows=None):
+        """
+        Escribe título, filtros, encabezados y filas ya formateadas en la hoja `ws`.
+        Con `nrows` las filas se agregan después (splice_sheet_rows) y solo se
+        dimensiona el autofiltro para ellas.
+        """
+        # ===== Título con nombre formal de la tabla =====
+        title_text = FORMAL_NAMES.get(table, table)
+        ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(cols))
+        tcell = ws.cell(row=1, column=1)
+        tcell.value = f"Exportación: {title_text}"
+        tcell.font = Font(size=14, bold=True)
+        tcell.alignment = Alignment(horizontal="center")
 
+        # ===== Resumen de filtros aplicados =====
         row_idx = 2
         for line in filters_lines:
             ws.merge_cells(start_row=row_idx, start_column=1, end_row=row_idx, end_column=len(cols))
@@ -721,36 +1546,368 @@ def make_app():
         def nice_label(col): return NICE_LABEL.get(col, col.replace('_',' ').title())
 
         header_row = row_idx
-        ws.append([nice_label(c) for c in cols])
+        headers = [nice_label(c) for c in cols]
+        ws.append(headers)
 
-        # ===== Filas de datos (booleans a Sí/No) =====
+        # ===== Filas de datos (booleans ya en Sí/No) =====
         for r in rows:
-            d = to_dict(r)
-            ws.append([("Sí" if d.get(c) is True else "No" if d.get(c) is False else d.get(c, "")) for c in cols])
+            ws.append(r)
 
         # Estilo encabezado + autofiltro + panes congelados (título + filtros arriba)
         for cell in ws[header_row]:
             cell.font = Font(bold=True)
-        ws.auto_filter.ref = f"A{header_row}:{get_column_letter(len(cols))}{header_row + max(len(rows),1)}"
+        nrows = len(rows) if nrows is None else nrows
+        ws.auto_filter.ref = f"A{header_row}:{get_column_letter(len(cols))}{header_row + max(nrows,1)}"
         ws.freeze_panes = f"A{header_row+1}"
 
-        # Ajuste de ancho
+        # Ajuste de ancho (título y filtros quedan en la columna A)
+        top = [len(str(tcell.value))] + [len(f"Filtro: {line}") for line in filters_lines]
         for idx in range(1, len(cols) + 1):
-            max_len = 0
-            for i in range(1, ws.max_row + 1):
-                v = ws.cell(row=i, column=idx).value
-                max_len = max(max_len, len(str(v)) if v is not None else 0)
+            max_len = max(widths[idx-1], len(headers[idx-1]), max(top) if idx == 1 else 0)
             ws.column_dimensions[get_column_letter(idx)].width = min(max(10, max_len + 2), 50)
 
-        # Respuesta .xlsx
+    def xlsx_response(wb, filename, parts=None):
+        """Respuesta .xlsx del libro; `parts` = XML de filas por hoja para splice_sheet_rows."""
         bio = BytesIO()
         wb.save(bio)
-        bio.seek(0)
-        resp = make_response(bio.read())
+        resp = make_response(bio.getvalue() if parts is None else splice_sheet_rows(bio.getvalue(), parts))
         resp.headers["Content-Type"] = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        resp.headers["Content-Disposition"] = f'attachment; filename="export_{table}.xlsx"'
+        resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
         return resp
 
+    export_pool = {}
+    export_pool_lock = threading.Lock()
+
+    def get_export_pool():
+        """ProcessPool perezoso (spawn: no hereda hilos ni conexiones del worker web)."""
+        with export_pool_lock:
+            if "pool" not in export_pool:
+                export_pool["pool"] = ProcessPoolExecutor(
+                    max_workers=app.config["EXPORT_WORKERS"],
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return export_pool["pool"]
+
+    def drop_export_pool(pool):
+        """Descarta un pool roto (un hijo murió) para que el próximo export cree otro."""
+        with export_pool_lock:
+            if export_pool.get("pool") is pool:
+                del export_pool["pool"]
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    @app.route("/api/export", methods=["POST"])
+    def api_export():
+        p = request.get_json(force=True) or {}
+        if isinstance(p.get("tables"), list):
+            return api_export_many(p)
+
+        table = p.get("table")
+        M = MODEL_MAP.get(table)
+        if not M:
+            return "Tabla desconocida", 404
+
+        # ----- Consulta con filtros -----
+        cols = export_cols(M, table)
+        rows = [[export_cell(v) for v in r] for r in read_session().execute(export_statement(M, cols, p))]
+
+        # ----- Excel -----
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Datos"
+        cf = p.get("column_filters") or {}
+        write_export_sheet(ws, table, cols, export_filters_lines(table, p, cf), rows, column_widths(rows, len(cols)))
+
+        # Respuesta .xlsx
+        return xlsx_response(wb, f"export_{table}.xlsx")
+
+    def api_export_many(p):
+        """
+        Un solo libro con una hoja por tabla operativa y filtros de fecha comunes.
+        Cada hoja se consulta, formatea y serializa (XML de sus filas) en paralelo
+        en el ProcessPool; aquí solo se arma el esqueleto del libro (título,
+        filtros, encabezados, anchos) y se insertan las filas de cada hoja.
+        """
+        tables = [t for t in p["tables"] if t in ORDER_BY_TABLE]
+        if not tables:
+            return "Tabla desconocida", 404
+
+        cf_all = p.get("column_filters") or {}
+        sheets = []
+        for table in tables:
+            M = MODEL_MAP[table]
+            cols = export_cols(M, table)
+            cf = {k: v for k, v in cf_all.items() if hasattr(M, k)}
+            sheets.append((table, cols, export_filters_lines(table, p, cf), export_statement(M, cols, p).compile(dialect=db.engine.dialect)))
+
+        url = read_url()
+        for attempt in (1, 2):
+            pool = get_export_pool()
+            try:
+                # encabezados en la fila 2 + filtros: los datos empiezan en la siguiente
+                futs = [pool.submit(export_sheet_part, url, str(compiled), compiled.params, len(cols), len(filters_lines) + 3)
+                        for _, cols, filters_lines, compiled in sheets]
+                parts = [f.result() for f in futs]
+                break
+            except BrokenProcessPool:
+                drop_export_pool(pool)
+                if attempt == 2:
+                    raise
+
+        wb = Workbook()
+        wb.remove(wb.active)
+        for (table, cols, filters_lines, _), (_, nrows, widths) in zip(sheets, parts):
+            title = re.sub(r'[\\/*?:\[\]]', '-', FORMAL_NAMES.get(table, table))[:31]
+            write_export_sheet(wb.create_sheet(title), table, cols, filters_lines, [], widths, nrows=nrows)
+
+        return xlsx_response(wb, "export_tablas.xlsx", [xml for xml, _, _ in parts])
+
+    # -----------------------------------------------------------------
+    # Importación masiva (XLSX / CSV) a tablas operativas
+    # -----------------------------------------------------------------
+    def iter_xlsx(fileobj):
+        """Filas de la hoja activa en modo read-only (memoria constante)."""
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+        try:
+            for row in wb.active.iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            wb.close()
+
+    def iter_csv(fileobj):
+        """Filas de un CSV UTF-8 separado por ',', ';' o tabulador (se detecta en la 1ª línea)."""
+        text_in = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        first = text_in.readline()
+        delim = max(",;\t", key=first.count)
+        yield from csv.reader([first], delimiter=delim)
+        yield from csv.reader(text_in, delimiter=delim)
+
+    def import_header_map(table, row):
+        """{índice de celda: columna} si `row` parece la fila de encabezados (NICE_LABEL o nombre)."""
+        norm = lambda v: str(v).strip().lower()
+        by_label = {}
+        for c in ORDER_BY_TABLE[table]:
+            by_label[norm(c)] = c
+            by_label[norm(NICE_LABEL.get(c, c.replace('_',' ').title()))] = c
+        found = {i: by_label[norm(v)] for i, v in enumerate(row) if v is not None and norm(v) in by_label}
+        return found if len(found) >= min(2, len(ORDER_BY_TABLE[table])) else None
+
+    def import_cell(v, py):
+        """
+        Celda de Excel/CSV al texto que espera parse_incoming (los formularios envían
+        texto), según el tipo Python `py` de la columna destino: Excel entrega fechas y
+        horas como datetime indistintamente.
+        """
+        if isinstance(v, str):
+            return v.strip()
+        if py is date and isinstance(v, (datetime, date)):
+            return (v.date() if isinstance(v, datetime) else v).isoformat()
+        if py is time and isinstance(v, (datetime, time)):
+            return v.strftime("%H:%M:%S")
+        if py is int and isinstance(v, float) and v.is_integer():
+            return int(v)
+        if py is str and v is not None:
+            return v.isoformat() if isinstance(v, (datetime, date, time)) else str(v)
+        return v
+
+    def import_rows(table, rows, owner):
+        """
+        Carga `rows` (iterable de listas de celdas, con título/filtros opcionales antes
+        de los encabezados) en `table`. Cada fila se convierte con parse_incoming y se
+        completa con `owner` (usuario y tenant). Las filas válidas se cargan por lotes
+        con COPY (INSERT fuera de PostgreSQL); si un lote falla se reintenta fila a fila
+        para aislar el error. Devuelve {"cargadas", "total_errores", "errores"}.
+        """
+        M = MODEL_MAP[table]
+        mcols = M.__table__.columns
+        load_cols = [c.name for c in mcols if not c.primary_key]
+        py_types = {c.name: c.type.python_type for c in mcols}
+        # fecha tiene default (hoy) para el formulario, pero en una carga masiva una fila
+        # sin fecha es un error del archivo, no un registro de hoy.
+        required = [c.name for c in mcols if not c.nullable and not c.primary_key and (c.default is None or c.name == "fecha")]
+        defaults = {c.name: c.default for c in mcols if c.default is not None and c.name != "fecha"}
+        is_pg = db.engine.dialect.name == "postgresql"
+        batch_rows = app.config["IMPORT_BATCH_ROWS"]
+        out = {"cargadas": 0, "total_errores": 0, "errores": []}
+
+        def error(line, msg):
+            out["total_errores"] += 1
+            if len(out["errores"]) < 1000:
+                out["errores"].append({"fila": line, "error": msg})
+
+        def copy_batch(batch):
+            buf = io.StringIO()
+            w = csv.writer(buf)
+            for _, r in batch:
+                w.writerow(["" if r[c] is None else str(r[c]) for c in load_cols])
+            buf.seek(0)
+            cols_sql = ", ".join(f'"{c}"' for c in load_cols)
+            cur = db.session.connection().connection.cursor()
+            cur.copy_expert(f"COPY {table} ({cols_sql}) FROM STDIN WITH (FORMAT csv)", buf)
+
+        def load(batch):
+            try:
+                with db.session.begin_nested():
+                    if is_pg:
+                        copy_batch(batch)
+                    else:
+                        db.session.execute(M.__table__.insert(), [r for _, r in batch])
+                out["cargadas"] += len(batch)
+            except Exception:
+                for line, r in batch:
+                    try:
+                        with db.session.begin_nested():
+                            db.session.execute(M.__table__.insert(), [r])
+                        out["cargadas"] += 1
+                    except Exception as e:
+                        error(line, str(getattr(e, "orig", e)).strip())
+            db.session.commit()
+
+        header, batch = None, []
+        for line, cells in enumerate(rows, start=1):
+            if header is None:
+                header = import_header_map(table, cells)
+                if header is None and line >= 20:
+                    error(line, "No se encontró la fila de encabezados")
+                    break
+                continue
+            if all(v in (None, "") for v in cells):
+                continue
+            try:
+                data = parse_incoming(M, {col: import_cell(cells[i], py_types[col]) for i, col in header.items() if i < len(cells)})
+            except (ValueError, TypeError, ArithmeticError) as e:
+                error(line, f"Valor inválido: {e}")
+                continue
+            data.update(owner)
+            for col, d in defaults.items():
+                if data.get(col) is None:
+                    data[col] = d.arg(None) if d.is_callable else d.arg
+            missing = [c for c in required if data.get(c) is None]
+            if missing:
+                error(line, "Falta: " + ", ".join(NICE_LABEL.get(c, c) for c in missing))
+                continue
+            batch.append((line, {c: data.get(c) for c in load_cols}))
+            if len(batch) >= batch_rows:
+                load(batch); batch = []
+        if batch:
+            load(batch)
+        if header is None and not out["errores"]:
+            error(0, "No se encontró la fila de encabezados")
+        return out
+
+    def import_file(table, fileobj, filename, owner):
+        if filename.lower().endswith((".xlsx", ".xlsm")):
+            return import_rows(table, iter_xlsx(fileobj), owner)
+        return import_rows(table, iter_csv(fileobj), owner)
+
+    @app.route("/api/import/<table>", methods=["POST"])
+    def api_import(table):
+        if table not in ORDER_BY_TABLE:
+            return "Tabla desconocida", 404
+        f = request.files.get("file")
+        if not f or not f.filename:
+            return "Archivo requerido", 400
+        if tenant_scope() is None:
+            return "Sesión requerida", 401
+        owner = {"usuario": session.get("usuario"), **tenant_values()}
+        return jsonify(import_file(table, f.stream, f.filename, owner))
+
+    @app.cli.command("import")
+    @click.argument("table")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--usuario", required=True, help="Usuario dueño de las filas (define razón social y restaurante).")
+    def import_command(table, path, usuario):
+        """Importa un XLSX/CSV a una tabla operativa."""
+        if table not in ORDER_BY_TABLE:
+            raise click.ClickException(f"Tabla desconocida: {table}")
+        u = Usuario.query.filter_by(nom_usuario=usuario).first()
+        if not u:
+            raise click.ClickException(f"Usuario desconocido: {usuario}")
+        owner = {"usuario": u.nom_usuario, "id_razon_social": u.id_razon_social, "id_restaurante": u.id_restaurante}
+        with open(path, "rb") as f:
+            out = import_file(table, f, path, owner)
+        click.echo(json.dumps(out, ensure_ascii=False, indent=2))
+
+    @app.cli.command("migrate-tenant")
+    @click.option("--razon-social", "id_razon_social", type=int,
+                  help="Razón social para las filas sin tenant (su 'usuario' no existe en tbl_usuario).")
+    @click.option("--restaurante", "id_restaurante", type=int, help="Restaurante para esas mismas filas (opcional).")
+    def migrate_tenant_command(id_razon_social, id_restaurante):
+        """
+        Agrega las columnas de tenant a las tablas operativas existentes, las rellena
+        desde el 'usuario' de cada fila y crea sus índices. Informa las filas que
+        quedan sin tenant y, con --razon-social, se las asigna. Se puede repetir.
+        """
+        if id_restaurante and not id_razon_social:
+            raise click.ClickException("--restaurante requiere --razon-social")
+        if id_restaurante:
+            rest = db.session.get(Restaurante, id_restaurante)
+            if not rest or rest.id_razon_social != id_razon_social:
+                raise click.ClickException(f"El restaurante {id_restaurante} no es de la razón social {id_razon_social}")
+        elif id_razon_social and not db.session.get(RazonSocial, id_razon_social):
+            raise click.ClickException(f"Razón social desconocida: {id_razon_social}")
+
+        # una sola transacción; en PostgreSQL el advisory lock evita dos migraciones a la vez
+        if db.engine.dialect.name == "postgresql":
+            db.session.execute(text("SELECT pg_advisory_xact_lock(hashtext('registerapp:migrate-tenant'))"))
+        insp = inspect(db.session.connection())
+        for table in ORDER_BY_TABLE:
+            if "id_razon_social" not in {c["name"] for c in insp.get_columns(table)}:
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN id_razon_social INTEGER REFERENCES tbl_razon_social(id)"))
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN id_restaurante INTEGER REFERENCES tbl_restaurante(id)"))
+                n = db.session.execute(text(
+                    f"UPDATE {table} SET id_razon_social = u.id_razon_social, id_restaurante = u.id_restaurante "
+                    f"FROM tbl_usuario u WHERE {table}.usuario = u.nom_usuario"
+                )).rowcount
+                click.echo(f"{table}: columnas agregadas, {n} filas con tenant")
+            for ix in MODEL_MAP[table].__table__.indexes:
+                ix.create(db.session.connection(), checkfirst=True)
+
+            orphans = db.session.execute(text(f"SELECT count(*) FROM {table} WHERE id_razon_social IS NULL")).scalar()
+            if orphans and id_razon_social:
+                db.session.execute(text(
+                    f"UPDATE {table} SET id_razon_social = :rs, id_restaurante = :rest WHERE id_razon_social IS NULL"
+                ), {"rs": id_razon_social, "rest": id_restaurante})
+                click.echo(f"{table}: {orphans} filas sin tenant asignadas a la razón social {id_razon_social}")
+            elif orphans:
+                users = db.session.execute(text(
+                    f"SELECT DISTINCT COALESCE(usuario, '(vacío)') FROM {table} WHERE id_razon_social IS NULL LIMIT 10"
+                )).scalars().all()
+                click.echo(f"{table}: {orphans} filas sin tenant (usuario: {', '.join(users)}); "
+                           f"no aparecen en ninguna lectura hasta asignarlas con --razon-social")
+        db.session.commit()
+
+    # -----------------------------------------------------------------
+    # Alertas activas (solo lee tbl_estado_alerta del tenant)
+    # -----------------------------------------------------------------
+    @app.route("/api/alertas", methods=["GET"])
+    def api_alertas():
+        scope = tenant_scope()
+        if scope is None:
+            return "Sesión requerida", 401
+        today = date.today()
+        rows = (db.session.query(EstadoAlerta, ConfReglaAlerta)
+                .join(ConfReglaAlerta, EstadoAlerta.id_regla == ConfReglaAlerta.id)
+                .filter(getattr(EstadoAlerta, scope[0]) == scope[1], ConfReglaAlerta.activo == True,
+                        or_(EstadoAlerta.alerta == True, ConfReglaAlerta.tipo == "sin_cambio"))
+                .all())
+        out = []
+        for st, rule in rows:
+            if rule.tipo == "sin_cambio":
+                if st.desde is None or (today - st.desde).days <= (rule.dias or 0):
+                    continue
+            out.append({
+                "tabla": rule.tabla,
+                "tabla_nombre": FORMAL_NAMES.get(rule.tabla, rule.tabla),
+                "regla": rule.descripcion,
+                "clave": st.clave,
+                "valor": st.valor,
+                "desde": st.desde.isoformat() if st.desde else None,
+                "ultima_fecha": st.ultima_fecha.isoformat() if st.ultima_fecha else None,
+                "ultimo_id": st.ultimo_id,
+            })
+        out.sort(key=lambda a: a["desde"] or "")
+        return jsonify(out)
+
     # -----------------------------------------------------------------
     # Conf. parámetro operativo: obtener mensaje activo por tabla
     # -----------------------------------------------------------------
@@ -770,6 +1927,11 @@ def make_app():
     def api_roles_tabs_get():
         require_admin()
         return jsonify(load_roles_tabs_from_db())
+
+    @app.route("/api/admision", methods=["GET"])
+    def api_admision():
+        require_admin()
+        return jsonify({k: v.state() for k, v in admission.items()})
         
     @app.route("/api/<table>", methods=["GET"])
     def api_list(table):
@@ -780,7 +1942,11 @@ def make_app():
             limit = int(request.args.get("limit", 100))
         except:
             limit = 100
-        rows = M.query.order_by(M.id.desc()).limit(limit).all()
+        limit = min(limit, app.config["QUERY_MAX_LIMIT"])
+        q = read_session().query(M)
+        flt = tenant_filters(M)
+        if flt: q = q.filter(and_(*flt))
+        rows = q.order_by(*recent_first(M)).limit(limit).all()
         return jsonify([to_dict(x) for x in rows])
 
     @app.route("/api/roles_tabs", methods=["POST"])
@@ -819,4 +1985,10 @@ def make_app():
 
 if __name__ == "__main__":
     app, db = make_app()
-    app.run(debug=True)
+    if len(sys.argv) > 1:
+        # comandos de consola, p.ej.: python app.py import tbl_bpm bpm.xlsx --usuario admin
+        #                             python app.py migrate-tenant [--razon-social 1]
+        from flask.cli import ScriptInfo
+        app.cli.main(args=sys.argv[1:], obj=ScriptInfo(create_app=lambda: app))
+    else:
+        app.run(debug=True)
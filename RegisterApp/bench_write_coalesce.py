@@ -0,0 +1,75 @@
+# bench_write_coalesce.py
+"""
+Mide el throughput de POST /api/tbl_bpm bajo carga concurrente,
+sin y con escritura agrupada (WRITE_COALESCE_MS), con la configuración de
+despliegue: por defecto tantos hilos como un worker web (--threads 4) y el
+control de admisión de escrituras vigente, así que un grupo no pasa de
+ADMISSION_WRITE filas.
+
+Uso:
+    python bench_write_coalesce.py [hilos] [inserciones_por_hilo] [ventana_ms] [rondas]
+Requiere la misma base PostgreSQL que la app (DATABASE_URL o PG*) y un usuario
+para iniciar sesión (BENCH_USER / BENCH_PASS, por defecto admin / admin).
+Alterna ambos modos en cada ronda e informa la mediana (el ruido entre corridas es alto).
+"""
+import os, sys, threading
+from statistics import median
+from time import perf_counter
+
+from app import make_app
+
+PAYLOAD = {
+    "nombre_auxiliar": "bench", "barba_maquillaje": True, "cabello_gorro": True,
+    "ausencia_heridas": True, "joyas_accesorios": True, "perfumes": True,
+    "unas_manos": True, "uniforme": True, "zapatos": True, "responsable": "bench",
+}
+
+
+def build(window_ms: int):
+    os.environ["WRITE_COALESCE_MS"] = str(window_ms)
+    return make_app()
+
+
+def run(app, db, threads: int, per_thread: int) -> float:
+    errors = []
+    clients = []
+    for _ in range(threads):
+        # las escrituras operativas requieren sesión (tenant)
+        client = app.test_client()
+        client.post("/login", data={"identifier": os.getenv("BENCH_USER", "admin"),
+                                    "password": os.getenv("BENCH_PASS", "admin")})
+        clients.append(client)
+
+    def worker(client):
+        for _ in range(per_thread):
+            r = client.post("/api/tbl_bpm", json=PAYLOAD)
+            if r.status_code != 201:
+                errors.append(r.status_code)
+
+    ts = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    t0 = perf_counter()
+    for t in ts: t.start()
+    for t in ts: t.join()
+    elapsed = perf_counter() - t0
+
+    with app.app_context():
+        db.session.execute(db.text("DELETE FROM tbl_bpm WHERE nombre_auxiliar = 'bench'"))
+        db.session.commit()
+    if errors:
+        print(f"  errores: {len(errors)}")
+    return threads * per_thread / elapsed
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    window = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    rounds = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+    plain, grouped = build(0), build(window)
+    base, coalesced = [], []
+    for _ in range(rounds):
+        base.append(run(*plain, threads, per_thread))
+        coalesced.append(run(*grouped, threads, per_thread))
+    b, g = median(base), median(coalesced)
+    print(f"sin agrupar:          {b:8.1f} inserciones/s (mediana de {rounds})")
+    print(f"agrupado ({window} ms):     {g:8.1f} inserciones/s  (x{g / b:.2f})")
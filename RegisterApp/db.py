@@ -5,16 +5,22 @@ from dotenv import load_dotenv
 # Cargar variables del archivo .env
 load_dotenv()
 
+
+def to_libpq_dsn(url):
+    """Convierte una URL de SQLAlchemy ('postgresql+psycopg2://...') a una que entienda psycopg2."""
+    if url and url.startswith("postgresql+psycopg2"):
+        url = url.replace("postgresql+psycopg2", "postgresql")
+    return url
+
 # Usa la misma cadena de conexión que definiste para SQLAlchemy
-dsn = os.getenv("SQLALCHEMY_DATABASE_URI")
-if dsn and dsn.startswith("postgresql+psycopg2"):
-    dsn = dsn.replace("postgresql+psycopg2", "postgresql")
+dsn = to_libpq_dsn(os.getenv("SQLALCHEMY_DATABASE_URI"))
 
-def get_conn():
+def get_conn(url=None):
     """
     Retorna una conexión psycopg2 a la base de datos PostgreSQL.
+    Si se pasa `url` (formato SQLAlchemy o libpq) se usa en lugar del DSN por defecto.
     Uso:
         with get_conn() as conn, conn.cursor() as cur:
             cur.execute("SELECT 1")
     """
-    return psycopg2.connect(dsn)
+    return psycopg2.connect(to_libpq_dsn(url) if url else dsn)
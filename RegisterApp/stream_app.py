@@ -0,0 +1,20 @@
+# stream_app.py
+"""
+Proceso dedicado al feed de cambios (SSE, /api/stream) con workers gevent:
+cada pantalla abierta es un greenlet casi inactivo en lugar de un hilo del
+proceso web (gthread), que queda libre para formularios y reportes.
+
+El proceso web publica la URL pública de este proceso en CHANGE_FEED_URL y
+este acepta al navegador de la UI con CHANGE_FEED_ALLOW_ORIGIN (CORS).
+"""
+import os
+
+from psycogreen.gevent import patch_psycopg
+
+patch_psycopg()  # psycopg2 cede el control a gevent mientras espera a PostgreSQL
+os.environ.setdefault("CHANGE_FEED_SERVER", "1")
+os.environ.setdefault("ADMISSION_STREAM", "0")  # aquí un stream no ocupa un hilo
+
+from app import make_app
+
+app, db = make_app()